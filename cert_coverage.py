@@ -0,0 +1,320 @@
+"""
+证书号覆盖情况查询工具
+
+汇总某个运动员在 history.json 和 logs/ 中的全部历史查询，给出已探测区间、
+未探测区间、命中位置和错误空洞，并规划下一次需要查询的最少区间。
+"""
+import argparse
+import glob
+import os
+from bisect import bisect_left, bisect_right
+
+from compact_history import iter_json_records, iter_store_name, load_index
+from history_records import result_rank
+
+
+class IntervalIndex:
+    """有序、互不相交的整数闭区间集合
+
+    区间按起点排序，并维护长度前缀和，查询均为 O(log n)。
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self._prefix = [0]  # _prefix[i] 为前 i 个区间覆盖的数字总数
+        for start, end in intervals:
+            self._append(start, end)
+
+    def _append(self, start, end):
+        """追加区间（必须在已有区间之后），与上一段相邻时合并"""
+        if self.ends and start <= self.ends[-1] + 1:
+            if end > self.ends[-1]:
+                self._prefix[-1] += end - self.ends[-1]
+                self.ends[-1] = end
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+        self._prefix.append(self._prefix[-1] + end - start + 1)
+
+    @classmethod
+    def from_numbers(cls, numbers):
+        """由任意顺序（可重复）的整数构建"""
+        index = cls()
+        for n in sorted(set(numbers)):
+            index._append(n, n)
+        return index
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __contains__(self, n):
+        i = bisect_right(self.starts, n) - 1
+        return i >= 0 and n <= self.ends[i]
+
+    def total(self):
+        """覆盖的数字总数"""
+        return self._prefix[-1]
+
+    def bounds(self):
+        """最小和最大数字，为空时返回 None"""
+        if not self.starts:
+            return None
+        return self.starts[0], self.ends[-1]
+
+    def _covered_upto(self, n):
+        """小于等于 n 的已覆盖数字个数"""
+        i = bisect_right(self.starts, n)
+        if i == 0:
+            return 0
+        return self._prefix[i - 1] + min(n, self.ends[i - 1]) - self.starts[i - 1] + 1
+
+    def count(self, lo, hi):
+        """[lo, hi] 内已覆盖的数字个数"""
+        if lo > hi:
+            return 0
+        return self._covered_upto(hi) - self._covered_upto(lo - 1)
+
+    def overlapping(self, lo, hi):
+        """[lo, hi] 内的区间（裁剪到边界）"""
+        i = bisect_left(self.ends, lo)
+        while i < len(self.starts) and self.starts[i] <= hi:
+            yield max(self.starts[i], lo), min(self.ends[i], hi)
+            i += 1
+
+    def gaps(self, lo, hi):
+        """[lo, hi] 内未覆盖的区间"""
+        cursor = lo
+        for start, end in self.overlapping(lo, hi):
+            if start > cursor:
+                yield cursor, start - 1
+            cursor = end + 1
+        if cursor <= hi:
+            yield cursor, hi
+
+
+class CertCoverage:
+    """单个运动员的证书号覆盖情况"""
+
+    def __init__(self, name, probed, hits, errors, non_numeric=0):
+        self.name = name
+        self.probed = probed            # 查询成功（含命中）的区间
+        self.hits = hits                # 有数据的证书号，升序
+        self.errors = errors            # 只有失败记录、需要重查的区间
+        self.non_numeric = non_numeric  # 无法放入区间的非数字证书号个数
+
+    @classmethod
+    def from_records(cls, name, records):
+        """由缓存记录构建，同一证书号取最好的结果（命中 > 无数据 > 失败）"""
+        best = {}
+        non_numeric = set()
+        for item in records:
+            if not isinstance(item, dict) or item.get('name') != name:
+                continue
+            cert_no = str(item.get('cert_no', ''))
+            if not cert_no.isdigit():
+                if cert_no:
+                    non_numeric.add(cert_no)
+                continue
+            n = int(cert_no)
+            rank = result_rank(item)
+            if rank > best.get(n, -1):
+                best[n] = rank
+
+        probed = IntervalIndex.from_numbers(n for n, rank in best.items() if rank > 0)
+        hits = sorted(n for n, rank in best.items() if rank == 2)
+        errors = IntervalIndex.from_numbers(n for n, rank in best.items() if rank == 0)
+        return cls(name, probed, hits, errors, len(non_numeric))
+
+    def default_range(self, start=None, end=None):
+        """未指定范围时使用历史记录的边界"""
+        bounds = [b for b in (self.probed.bounds(), self.errors.bounds()) if b]
+        if start is None:
+            if not bounds:
+                return None
+            start = min(b[0] for b in bounds)
+        if end is None:
+            if not bounds:
+                return None
+            end = max(b[1] for b in bounds)
+        return start, end
+
+    def hits_in(self, lo, hi):
+        """[lo, hi] 内的命中位置"""
+        return self.hits[bisect_left(self.hits, lo):bisect_right(self.hits, hi)]
+
+    def gaps(self, lo, hi):
+        """[lo, hi] 内尚未成功探测的区间（错误空洞也在其中，sniper.py 会重新查询）"""
+        return list(self.probed.gaps(lo, hi))
+
+    def plan(self, lo, hi, merge_gap=0, max_size=None):
+        """规划需要查询的区间
+
+        间隔不超过 merge_gap 的未探测区间合并成一段（已缓存的号码查询时会跳过），
+        max_size 限制每段的长度。
+        """
+        if merge_gap < 0:
+            raise ValueError("合并间隔不能为负数!")
+        if max_size is not None and max_size < 1:
+            raise ValueError("每段长度必须大于0!")
+        ranges = []
+        for start, end in self.probed.gaps(lo, hi):
+            if ranges and start - ranges[-1][1] - 1 <= merge_gap:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+
+        if max_size is not None:
+            split = []
+            for start, end in ranges:
+                while end - start + 1 > max_size:
+                    split.append([start, start + max_size - 1])
+                    start += max_size
+                split.append([start, end])
+            ranges = split
+        return [tuple(r) for r in ranges]
+
+
+def iter_name_records(name, cache_file="history.json", logs_dir="logs"):
+    """流式读取某个姓名的全部历史记录
+
+    history.json 有有效索引（compact_history.py 生成）时只读该姓名所在的区段，
+    日志按文件名中的姓名预先筛选。
+    """
+    if cache_file and os.path.exists(cache_file):
+        index = load_index(cache_file)
+        if index is not None:
+            yield from iter_store_name(cache_file, name, index)
+        else:
+            try:
+                for _, item in iter_json_records(cache_file):
+                    if isinstance(item, dict) and item.get('name') == name:
+                        yield item
+            except ValueError:
+                # 截断或损坏的文件只取已读出的部分
+                pass
+
+    if logs_dir and os.path.isdir(logs_dir):
+        pattern = os.path.join(glob.escape(logs_dir), f"results_{glob.escape(name)}_*.json")
+        for path in sorted(glob.glob(pattern)):
+            try:
+                for _, item in iter_json_records(path):
+                    if isinstance(item, dict) and item.get('name') == name:
+                        yield item
+            except ValueError:
+                # 截断或损坏的文件只取已读出的部分
+                pass
+
+
+def load_coverage(name, cache_file="history.json", logs_dir="logs"):
+    """加载某个姓名的覆盖情况"""
+    return CertCoverage.from_records(name, iter_name_records(name, cache_file, logs_dir))
+
+
+def format_ranges(ranges, limit=50):
+    """格式化区间列表"""
+    lines = []
+    ranges = list(ranges)
+    for start, end in ranges[:limit]:
+        if start == end:
+            lines.append(f"  {start}")
+        else:
+            lines.append(f"  {start} - {end} ({end - start + 1}个)")
+    if len(ranges) > limit:
+        lines.append(f"  ... 还有 {len(ranges) - limit} 段")
+    return lines
+
+
+def print_coverage(coverage, start=None, end=None, limit=50):
+    """打印覆盖情况"""
+    print(f"运动员: {coverage.name}")
+    bounds = coverage.default_range(start, end)
+    if bounds is None:
+        print("没有历史查询记录")
+        return
+    lo, hi = bounds
+    if lo > hi:
+        print("起始号不能大于结束号!")
+        return
+    total = hi - lo + 1
+
+    probed = list(coverage.probed.overlapping(lo, hi))
+    probed_count = coverage.probed.count(lo, hi)
+    print(f"范围: {lo} - {hi} (共{total}个)")
+    print(f"已探测: {probed_count}个, 未探测: {total - probed_count}个")
+
+    print(f"\n已探测区间 ({len(probed)}段):")
+    for line in format_ranges(probed, limit):
+        print(line)
+
+    hits = coverage.hits_in(lo, hi)
+    print(f"\n命中位置 ({len(hits)}个):")
+    for n in hits[:limit]:
+        print(f"  {n}")
+
+    errors = list(coverage.errors.overlapping(lo, hi))
+    if errors:
+        print(f"\n错误空洞 ({coverage.errors.count(lo, hi)}个, {len(errors)}段):")
+        for line in format_ranges(errors, limit):
+            print(line)
+
+    gaps = coverage.gaps(lo, hi)
+    print(f"\n未探测区间 ({len(gaps)}段):")
+    for line in format_ranges(gaps, limit):
+        print(line)
+
+    if coverage.non_numeric:
+        print(f"\n非数字证书号: {coverage.non_numeric}个（不计入区间）")
+
+
+def main():
+    """主程序"""
+    parser = argparse.ArgumentParser(description="查询运动员证书号的历史覆盖情况")
+    parser.add_argument("--cache", default="history.json", help="历史缓存文件 (默认 history.json)")
+    parser.add_argument("--logs", default="logs", help="日志文件夹 (默认 logs)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show_parser = subparsers.add_parser("show", help="显示已探测区间、命中、错误空洞和未探测区间")
+    show_parser.add_argument("name", help="运动员姓名")
+    show_parser.add_argument("--start", type=int, help="起始证书号 (默认历史最小值)")
+    show_parser.add_argument("--end", type=int, help="结束证书号 (默认历史最大值)")
+    show_parser.add_argument("--limit", type=int, default=50, help="每类最多显示的条数")
+
+    plan_parser = subparsers.add_parser("plan", help="规划下一次需要查询的区间")
+    plan_parser.add_argument("name", help="运动员姓名")
+    plan_parser.add_argument("start", type=int, help="起始证书号")
+    plan_parser.add_argument("end", type=int, help="结束证书号")
+    plan_parser.add_argument("--merge-gap", type=int, default=0,
+                             help="间隔不超过该值的区间合并为一段 (默认 0)")
+    plan_parser.add_argument("--max-size", type=int, default=None, help="每段最多包含的号码数")
+
+    args = parser.parse_args()
+    if args.command == "show" and args.limit < 0:
+        print("显示条数不能为负数!")
+        return
+    coverage = load_coverage(args.name, args.cache, args.logs)
+
+    if args.command == "show":
+        print_coverage(coverage, args.start, args.end, args.limit)
+        return
+
+    if args.start > args.end:
+        print("起始号不能大于结束号!")
+        return
+    try:
+        ranges = coverage.plan(args.start, args.end, args.merge_gap, args.max_size)
+    except ValueError as e:
+        print(e)
+        return
+    remaining = sum(end - start + 1 for start, end in ranges)
+    print(f"运动员: {args.name}")
+    print(f"范围: {args.start} - {args.end}, 待查询: {remaining}个, 共{len(ranges)}段")
+    for start, end in ranges:
+        print(f"  {start} {end}")
+
+
+if __name__ == "__main__":
+    main()
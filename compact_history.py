@@ -0,0 +1,359 @@
+"""
+历史缓存压缩与迁移工具
+
+流式读取 history.json（数组或字典格式）以及 logs/ 下每次运行产生的
+results_*.json，按缓存键去重（有数据的最新结果优先），丢弃网络错误等
+临时失败记录，输出排好序的紧凑 history.json 和按姓名的偏移索引。
+"""
+import argparse
+import glob
+import json
+import os
+import re
+
+from history_records import result_rank
+
+# 流式读取时每次读入的字符数
+CHUNK_SIZE = 64 * 1024
+
+INDEX_VERSION = 1
+
+
+# 已完成运行的日志：results_{姓名}_{时间}_{起始}_{结束}_{总数}.json，
+# 运行中的日志以 _temp.json 结尾
+FINISHED_LOG_PATTERN = re.compile(r"^results_.+_\d+\.json$")
+
+JSON_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+INCOMPLETE_NUMBER_PATTERN = re.compile(r"^[-+.eE\d]+$")
+
+
+class TruncatedJSONError(ValueError):
+    """JSON 文件在结尾处被截断（如中断运行留下的 _temp.json）"""
+
+
+class CorruptJSONError(ValueError):
+    """JSON 文件中间有无法解析的内容"""
+
+
+def _reached_end(error, buffer):
+    """解析失败是否因为数据在缓冲区末尾不完整（而不是内容本身有误）"""
+    # 未闭合的字符串说明其后再没有引号，一定是读到了末尾
+    if error.msg.startswith("Unterminated string"):
+        return True
+    # 出错位置之后只剩被截断的字面量（如 "tr"、"nul"）或数字片段
+    rest = buffer[error.pos:].rstrip()
+    return (not rest or INCOMPLETE_NUMBER_PATTERN.match(rest) is not None or
+            any(literal.startswith(rest) for literal in JSON_LITERALS))
+
+
+def _skip_ws(buffer, pos, skip=" \t\r\n"):
+    """跳过空白（及指定的分隔字符）"""
+    while pos < len(buffer) and buffer[pos] in skip:
+        pos += 1
+    return pos
+
+
+def iter_json_records(path, chunk_size=CHUNK_SIZE):
+    """流式迭代 JSON 文件顶层容器中的元素，不整体载入内存
+
+    数组格式产出 (None, item)，字典格式产出 (key, value)。
+    文件被截断时已完整读出的元素照常产出，最后抛出 TruncatedJSONError；
+    中间有内容损坏时抛出 CorruptJSONError，顶层不是数组或对象时抛出 ValueError。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            # 读入更多数据，丢弃已消费的前缀
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def decode():
+            # 解析一个完整的 JSON 值，数据不足时继续读
+            nonlocal pos
+            while True:
+                start = _skip_ws(buffer, pos)
+                try:
+                    value, end = decoder.raw_decode(buffer, start)
+                except json.JSONDecodeError as e:
+                    if not _reached_end(e, buffer):
+                        raise CorruptJSONError(f"{path} 格式错误: {e.msg}")
+                    if not fill():
+                        raise TruncatedJSONError(f"{path} 在结尾处被截断")
+                    continue
+                # 数字可能恰好在块边界被截断，确认其后还有内容
+                if end == len(buffer) and not eof and fill():
+                    continue
+                pos = end
+                return value
+
+        def next_token(skip=" \t\r\n"):
+            # 返回下一个非空白字符（不消费）
+            nonlocal pos
+            while True:
+                pos = _skip_ws(buffer, pos, skip)
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not fill():
+                    return None
+
+        opening = next_token()
+        if opening not in ('[', '{'):
+            if opening is None:
+                return
+            raise ValueError(f"{path} 不是 JSON 数组或对象")
+        closing = ']' if opening == '[' else '}'
+        pos += 1
+
+        while True:
+            token = next_token(" \t\r\n,")
+            if token is None:
+                raise TruncatedJSONError(f"{path} 在结尾处被截断")
+            if token == closing:
+                return
+            if opening == '[':
+                yield None, decode()
+            else:
+                key = decode()
+                if next_token() != ':':
+                    raise CorruptJSONError(f"{path} 字典格式错误")
+                pos += 1
+                yield key, decode()
+
+
+def iter_history_files(cache_file="history.json", logs_dir="logs"):
+    """列出需要合并的文件：先历史缓存，再按文件名（含时间戳）排序的日志"""
+    files = []
+    if cache_file and os.path.exists(cache_file):
+        files.append(cache_file)
+    if logs_dir and os.path.isdir(logs_dir):
+        files.extend(sorted(glob.glob(os.path.join(logs_dir, "results_*.json"))))
+    return files
+
+
+def is_finished_log(path):
+    """是否为已完成运行的日志（运行中的 _temp.json 不算）"""
+    return bool(FINISHED_LOG_PATTERN.match(os.path.basename(path)))
+
+
+def cert_sort_key(cert_no):
+    """证书号排序键：纯数字按数值，其他按字符串排在后面"""
+    cert_no = str(cert_no)
+    if cert_no.isdigit():
+        return (0, int(cert_no), cert_no)
+    return (1, 0, cert_no)
+
+
+def merge_records(paths, stats=None):
+    """合并所有文件中的记录，返回 {缓存键: 记录}
+
+    同一缓存键优先保留有数据的结果，同级别时保留时间较新的。
+    截断、损坏或格式不对的文件已读出的记录照常合并，只有完整读完的文件
+    会记入 stats["complete_paths"]。
+    """
+    if stats is None:
+        stats = {}
+    for field in ("files", "input_bytes", "records", "invalid", "errors", "duplicates",
+                  "truncated", "corrupt", "invalid_files"):
+        stats.setdefault(field, 0)
+    stats.setdefault("complete_paths", [])
+
+    merged = {}
+    for path in paths:
+        stats["files"] += 1
+        stats["input_bytes"] += os.path.getsize(path)
+        try:
+            for _, item in iter_json_records(path):
+                stats["records"] += 1
+                if not isinstance(item, dict) or 'name' not in item or 'cert_no' not in item:
+                    stats["invalid"] += 1
+                    continue
+                rank = result_rank(item)
+                if rank == 0:
+                    stats["errors"] += 1
+                    continue
+
+                key = f"{item['name']}_{item['cert_no']}"
+                existing = merged.get(key)
+                if existing is not None:
+                    stats["duplicates"] += 1
+                    existing_rank = result_rank(existing)
+                    if rank < existing_rank:
+                        continue
+                    if rank == existing_rank and str(item.get("time", "")) < str(existing.get("time", "")):
+                        continue
+                merged[key] = item
+        except TruncatedJSONError:
+            stats["truncated"] += 1
+        except CorruptJSONError as e:
+            stats["corrupt"] += 1
+            print(f"跳过损坏文件的剩余部分: {e}")
+        except ValueError as e:
+            stats["invalid_files"] += 1
+            print(f"跳过无效文件: {path} ({e})")
+        else:
+            stats["complete_paths"].append(path)
+    return merged
+
+
+def index_path_for(store_file):
+    """紧凑存储对应的索引文件路径"""
+    root, _ = os.path.splitext(store_file)
+    return f"{root}.idx.json"
+
+
+def write_store(records, store_file):
+    """写出紧凑存储和索引，返回写入的条目数
+
+    存储格式与 SimpleAthleteQuery.load_cache 兼容（每行一条的数组），
+    按姓名、证书号排序；索引记录每个姓名所在的字节区间。
+    """
+    items = sorted(records.values(), key=lambda x: (str(x['name']), cert_sort_key(x['cert_no'])))
+
+    names = {}
+    temp_file = store_file + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(b'[\n')
+        for i, item in enumerate(items):
+            offset = f.tell()
+            line = '  ' + json.dumps(item, ensure_ascii=False)
+            line += ',\n' if i < len(items) - 1 else '\n'
+            f.write(line.encode('utf-8'))
+
+            name = str(item['name'])
+            if name in names:
+                names[name][1] = f.tell()
+                names[name][2] += 1
+            else:
+                names[name] = [offset, f.tell(), 1]
+        f.write(b']')
+    os.replace(temp_file, store_file)
+
+    stat = os.stat(store_file)
+    index = {
+        "version": INDEX_VERSION,
+        "store_size": stat.st_size,
+        "store_mtime_ns": stat.st_mtime_ns,
+        "names": names
+    }
+    with open(index_path_for(store_file), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    return len(items)
+
+
+def load_index(store_file):
+    """加载索引；存储文件在建索引后被改写过（如 sniper.py 保存缓存）时返回 None"""
+    index_file = index_path_for(store_file)
+    if not os.path.exists(index_file) or not os.path.exists(store_file):
+        return None
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(store_file)
+    if (index.get("version") != INDEX_VERSION or
+            index.get("store_size") != stat.st_size or
+            index.get("store_mtime_ns") != stat.st_mtime_ns):
+        return None
+    return index
+
+
+def iter_store_name(store_file, name, index):
+    """借助索引只读取某个姓名的记录"""
+    entry = index["names"].get(name)
+    if not entry:
+        return
+    start, end, _ = entry
+    with open(store_file, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    # 按原始字节的换行拆分：ensure_ascii=False 写出的字符串可能含有
+    # U+2028 等 str.splitlines() 也会当作换行的字符
+    for line in chunk.split(b'\n'):
+        line = line.strip().rstrip(b',')
+        if line:
+            yield json.loads(line.decode('utf-8'))
+
+
+def compact(cache_file="history.json", logs_dir="logs", output=None, prune_logs=False):
+    """执行压缩，返回统计信息"""
+    output = output or cache_file
+    paths = iter_history_files(cache_file, logs_dir)
+    stats = {}
+    records = merge_records(paths, stats)
+    stats["unique"] = len(records)
+    stats["output_records"] = write_store(records, output)
+    stats["output_bytes"] = os.path.getsize(output)
+    stats["index_bytes"] = os.path.getsize(index_path_for(output))
+
+    pruned = 0
+    if prune_logs:
+        # 只删除已完成运行且完整读完的日志，截断、损坏和运行中的日志保留
+        for path in stats["complete_paths"]:
+            if path == cache_file or os.path.abspath(path) == os.path.abspath(output):
+                continue
+            if is_finished_log(path):
+                os.remove(path)
+                pruned += 1
+    stats["pruned"] = pruned
+    return stats
+
+
+def format_size(num_bytes):
+    """格式化字节数"""
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def print_report(stats):
+    """打印体积报告"""
+    input_bytes = stats["input_bytes"]
+    output_bytes = stats["output_bytes"] + stats["index_bytes"]
+    print("=" * 50)
+    print("历史缓存压缩报告")
+    print("=" * 50)
+    print(f"读取文件: {stats['files']}个 (其中截断: {stats['truncated']}个, "
+          f"损坏: {stats['corrupt']}个, 无效: {stats['invalid_files']}个)")
+    print(f"读取记录: {stats['records']}条")
+    print(f"丢弃临时错误: {stats['errors']}条")
+    print(f"丢弃无效记录: {stats['invalid']}条")
+    print(f"重复记录: {stats['duplicates']}条")
+    print(f"保留记录: {stats['output_records']}条")
+    print(f"输入体积: {format_size(input_bytes)}")
+    print(f"输出体积: {format_size(output_bytes)} (索引 {format_size(stats['index_bytes'])})")
+    if input_bytes > 0:
+        print(f"压缩比: {(output_bytes / input_bytes * 100):.1f}%")
+    if stats["pruned"]:
+        print(f"已删除日志: {stats['pruned']}个")
+    print("=" * 50)
+
+
+def main():
+    """主程序"""
+    parser = argparse.ArgumentParser(description="压缩 history.json 与 logs/ 中的历史查询记录")
+    parser.add_argument("--cache", default="history.json", help="历史缓存文件 (默认 history.json)")
+    parser.add_argument("--logs", default="logs", help="日志文件夹 (默认 logs)")
+    parser.add_argument("--output", default=None, help="输出文件 (默认覆盖缓存文件)")
+    parser.add_argument("--prune-logs", action="store_true", help="压缩完成后删除已合并的日志文件")
+    args = parser.parse_args()
+
+    stats = compact(args.cache, args.logs, args.output, args.prune_logs)
+    print_report(stats)
+
+
+if __name__ == "__main__":
+    main()
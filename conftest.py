@@ -0,0 +1,20 @@
+"""
+测试共用的 fixture
+"""
+import pytest
+
+
+@pytest.fixture
+def make_item():
+    """构造一条与 sniper.py 缓存格式相同的记录"""
+    def factory(name, cert_no, time="2024-01-01T00:00:00", has_data=False, success=True):
+        if not success:
+            response = {"query_success": False, "has_data": False, "error": "HTTP 502"}
+        else:
+            response = {
+                "response": 0, "error": 0,
+                "data": {"total": 1 if has_data else 0, "list": []},
+                "query_success": True, "has_data": has_data
+            }
+        return {"time": time, "cert_no": str(cert_no), "name": name, "response": response}
+    return factory
@@ -0,0 +1,13 @@
+"""
+查询记录的共用判定规则
+
+sniper.py、compact_history.py 和 cert_coverage.py 对缓存记录的判定保持一致。
+"""
+
+
+def result_rank(item):
+    """结果优先级：2=有数据，1=查询成功无数据，0=查询失败（需要重新查询）"""
+    response = item.get("response") if isinstance(item, dict) else None
+    if not isinstance(response, dict) or not response.get("query_success", False):
+        return 0
+    return 2 if response.get("has_data", False) else 1
@@ -0,0 +1,274 @@
+"""
+响应判定回放测试与基准
+
+从 logs/ 中的历史结果还原接口响应，录制成语料（每行一条 JSON），
+离线回放 sniper.py 中的响应解析、判定和结果统计，检查结果是否与
+录制时一致，并测量每条响应的 CPU 耗时。
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from compact_history import iter_json_records
+from sniper import classify_response, make_entry, parse_response_text, result_athletes
+
+CORPUS_FILE = "replay_corpus.jsonl"
+
+INVALID_ERROR = "API返回无效响应（error为空或null），视为查询失败"
+API_ERROR_PREFIX = "API返回error="
+API_ERROR_SUFFIX = "，查询失败"
+
+
+def outcome_of(entry, cacheable):
+    """判定结果中需要保持不变的部分"""
+    query_success, has_data, athletes = result_athletes(entry)
+    return {
+        "cache": cacheable,
+        "query_success": query_success,
+        "has_data": has_data,
+        "athletes": len(athletes)
+    }
+
+
+def label_of(outcome):
+    """结果分类标签"""
+    if not outcome["cache"]:
+        return "rejected"
+    if not outcome["query_success"]:
+        return "failed"
+    return "hit" if outcome["has_data"] else "empty"
+
+
+def case_from_log(item):
+    """由日志中的一条结果还原接口响应，无法还原（如网络异常）时返回 None
+
+    日志中保存的是判定后的响应：正常响应去掉判定时加上的字段即为原始响应，
+    HTTP 错误、JSON 解析失败和被拒绝的响应按错误信息还原。
+    """
+    response = item.get("response")
+    if not isinstance(response, dict):
+        return None
+    error = response.get("error")
+    content_type = "application/json"
+    cacheable = True
+
+    if "response" in response:
+        raw = {k: v for k, v in response.items() if k not in ("query_success", "has_data")}
+        status, body = 200, json.dumps(raw, ensure_ascii=False)
+    elif "response_text" in response:
+        status, body = 200, response["response_text"]
+        content_type = response.get("content_type", "未知")
+    elif isinstance(error, str) and error.startswith("HTTP "):
+        if not error[5:].isdigit():
+            return None
+        status, body = int(error[5:]), ""
+    elif error == INVALID_ERROR:
+        status, body = 200, json.dumps({"error": None})
+        cacheable = False
+    elif isinstance(error, str) and error.startswith(API_ERROR_PREFIX) and error.endswith(API_ERROR_SUFFIX):
+        value = error[len(API_ERROR_PREFIX):-len(API_ERROR_SUFFIX)]
+        value = int(value) if value.lstrip('-').isdigit() else value
+        status, body = 200, json.dumps({"response": 1, "error": value}, ensure_ascii=False)
+        cacheable = False
+    elif response.get("query_success"):
+        # 没有response字段的其他格式
+        raw = {k: v for k, v in response.items() if k not in ("query_success", "has_data")}
+        status, body = 200, json.dumps(raw, ensure_ascii=False)
+    else:
+        return None
+
+    expected = {
+        "cache": cacheable,
+        "query_success": bool(response.get("query_success", False)),
+        "has_data": bool(response.get("has_data", False)),
+        "athletes": 0
+    }
+    if expected["has_data"] and isinstance(response.get("data"), dict):
+        athletes = response["data"].get("list", [])
+        expected["athletes"] = len(athletes) if isinstance(athletes, list) else 0
+
+    return {
+        "name": item.get("name", ""),
+        "cert_no": str(item.get("cert_no", "")),
+        "status": status,
+        "content_type": content_type,
+        "body": body,
+        "expected": dict(expected, label=label_of(expected))
+    }
+
+
+def capture(logs_dir="logs", corpus_file=CORPUS_FILE, per_label=200):
+    """从日志录制语料，每个标签最多保留 per_label 条（命中全部保留）
+
+    已有语料中的条目保留，按 (状态码, 响应体) 去重。返回各标签新增数量。
+    """
+    cases = []
+    seen = set()
+    if os.path.exists(corpus_file):
+        cases = load_corpus(corpus_file)
+        seen = {(c["status"], c["body"]) for c in cases}
+
+    counts = {}
+    for case in cases:
+        label = case["expected"]["label"]
+        counts[label] = counts.get(label, 0) + 1
+
+    added = {}
+    for path in sorted(glob.glob(os.path.join(logs_dir, "results_*.json"))):
+        try:
+            for _, item in iter_json_records(path):
+                case = case_from_log(item) if isinstance(item, dict) else None
+                if case is None or (case["status"], case["body"]) in seen:
+                    continue
+                label = case["expected"]["label"]
+                if label != "hit" and counts.get(label, 0) >= per_label:
+                    continue
+                case["source"] = os.path.basename(path)
+                seen.add((case["status"], case["body"]))
+                cases.append(case)
+                counts[label] = counts.get(label, 0) + 1
+                added[label] = added.get(label, 0) + 1
+        except ValueError:
+            # 截断或损坏的文件只取已读出的部分
+            pass
+
+    with open(corpus_file, 'w', encoding='utf-8') as f:
+        for case in cases:
+            f.write(json.dumps(case, ensure_ascii=False) + '\n')
+    return added
+
+
+def load_corpus(corpus_file=CORPUS_FILE):
+    """加载语料"""
+    cases = []
+    with open(corpus_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                cases.append(json.loads(line))
+    return cases
+
+
+def replay_case(case):
+    """回放一条响应，返回 (记录, 是否缓存)
+
+    与 query_one 一致：200 时解析响应体，其他状态码不解析；
+    判定过程抛出的异常按请求异常处理并缓存。响应体统一走文本解析，
+    对应 resp.json() 失败后的回退路径。
+    """
+    try:
+        result = None
+        if case["status"] == 200:
+            result = parse_response_text(case["body"], case.get("content_type", "未知"))
+        return classify_response(case["name"], case["cert_no"], case["status"], result)
+    except Exception as e:
+        return make_entry(case["name"], case["cert_no"], {
+            "query_success": False,
+            "has_data": False,
+            "error": str(e)
+        }), True
+
+
+def check(cases):
+    """回放全部语料，返回 (统计, 不一致的条目列表)"""
+    totals = {"successful": 0, "valid": 0, "athletes": 0, "cached": 0}
+    mismatches = []
+    for case in cases:
+        entry, cacheable = replay_case(case)
+        outcome = outcome_of(entry, cacheable)
+        outcome["label"] = label_of(outcome)
+        if outcome != case["expected"]:
+            mismatches.append((case, outcome))
+
+        # 与 batch_query 相同的结果统计
+        totals["successful"] += outcome["query_success"]
+        totals["valid"] += outcome["has_data"]
+        totals["athletes"] += outcome["athletes"]
+        totals["cached"] += cacheable
+    return totals, mismatches
+
+
+def benchmark(cases, repeat=20):
+    """测量每条响应的平均耗时（纳秒），返回 {阶段: (CPU时间, 墙钟时间)}"""
+    total = len(cases) * repeat
+    if total == 0:
+        return {}
+    inputs = [(c["name"], c["cert_no"], c["status"], c["body"], c.get("content_type", "未知")) for c in cases]
+    replayed = [replay_case(c) for c in cases]
+
+    def measure(func):
+        cpu, wall = time.process_time_ns(), time.perf_counter_ns()
+        for _ in range(repeat):
+            func()
+        return (time.process_time_ns() - cpu) / total, (time.perf_counter_ns() - wall) / total
+
+    def run_parse():
+        for _, _, status, body, content_type in inputs:
+            if status == 200:
+                parse_response_text(body, content_type)
+
+    def run_classify():
+        for name, cert_no, status, body, content_type in inputs:
+            try:
+                result = parse_response_text(body, content_type) if status == 200 else None
+                classify_response(name, cert_no, status, result)
+            except Exception:
+                pass
+
+    def run_aggregate():
+        for entry, _ in replayed:
+            result_athletes(entry)
+
+    return {
+        "parse": measure(run_parse),
+        "parse+classify": measure(run_classify),
+        "aggregate": measure(run_aggregate),
+    }
+
+
+def main():
+    """主程序"""
+    parser = argparse.ArgumentParser(description="回放录制的响应，检查判定结果并测量耗时")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help=f"语料文件 (默认 {CORPUS_FILE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = subparsers.add_parser("capture", help="从日志录制语料")
+    capture_parser.add_argument("--logs", default="logs", help="日志文件夹 (默认 logs)")
+    capture_parser.add_argument("--per-label", type=int, default=200, help="每个标签最多录制的条数")
+
+    run_parser = subparsers.add_parser("run", help="回放语料并测量耗时")
+    run_parser.add_argument("--repeat", type=int, default=20, help="基准测试重复次数")
+
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        added = capture(args.logs, args.corpus, args.per_label)
+        print(f"新增语料: {sum(added.values())}条")
+        for label, count in sorted(added.items()):
+            print(f"  {label}: {count}条")
+        return
+
+    cases = load_corpus(args.corpus)
+    totals, mismatches = check(cases)
+    print(f"语料: {len(cases)}条")
+    print(f"成功查询: {totals['successful']}个, 有效数据: {totals['valid']}个, "
+          f"运动员: {totals['athletes']}个, 缓存: {totals['cached']}个")
+    if mismatches:
+        print(f"\n✗ 判定不一致: {len(mismatches)}条")
+        for case, outcome in mismatches[:10]:
+            print(f"  证书号: {case['cert_no']} 期望: {case['expected']} 实际: {outcome}")
+    else:
+        print("✓ 判定结果全部一致")
+
+    print(f"\n每条响应平均耗时 (重复{args.repeat}次):")
+    for stage, (cpu, wall) in benchmark(cases, args.repeat).items():
+        print(f"  {stage}: CPU {cpu / 1000:.2f}µs, 墙钟 {wall / 1000:.2f}µs")
+
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,101 @@ import os
 from datetime import datetime
 from tqdm.asyncio import tqdm
 
+from cert_coverage import CertCoverage, format_ranges
+from history_records import result_rank
+
+
+def make_entry(name, cert_no, response):
+    """生成一条查询记录"""
+    return {
+        "time": datetime.now().isoformat(),
+        "cert_no": cert_no,
+        "name": name,
+        "response": response
+    }
+
+
+def parse_response_text(text_content, content_type):
+    """从响应文本解析JSON，失败时返回解析错误结果"""
+    try:
+        return json.loads(text_content)
+    except Exception as e:
+        return {
+            "query_success": False,
+            "has_data": False,
+            "error": f"JSON解析失败: {str(e)}",
+            "content_type": content_type,
+            "response_text": text_content[:500]
+        }
+
+
+def classify_response(name, cert_no, status, result):
+    """判定单个响应的查询结果
+    
+    返回 (记录, 是否缓存)。result 为解析后的响应，会被就地标记
+    query_success 和 has_data。
+    """
+    if status != 200:
+        return make_entry(name, cert_no, {
+            "query_success": False,
+            "has_data": False,
+            "error": f"HTTP {status}"
+        }), True
+    
+    # 检查是否只有error字段（无response字段），或error为null/空字符串且没有其他有效字段
+    # 这种情况视为查询失败，不缓存
+    if isinstance(result, dict):
+        # 情况1: 只有error字段，且为空字符串或null
+        if "response" not in result and "error" in result:
+            error_value = result.get("error")
+            if error_value is None or error_value == "":
+                return make_entry(name, cert_no, {
+                    "query_success": False,
+                    "has_data": False,
+                    "error": "API返回无效响应（error为空或null），视为查询失败"
+                }), False
+        
+        # 情况2: 有response字段，但error不为0，视为查询失败
+        if "response" in result and "error" in result:
+            error_value = result.get("error")
+            # error不为0（可能是数字或字符串），视为失败
+            if error_value != 0 and error_value != "0":
+                return make_entry(name, cert_no, {
+                    "query_success": False,
+                    "has_data": False,
+                    "error": f"API返回error={error_value}，查询失败"
+                }), False
+        
+        # 标记查询是否成功和是否有数据
+        # 如果结果包含response字段，说明是API正常响应
+        if "response" in result:
+            result["query_success"] = True
+            result["has_data"] = (
+                result.get("response") == 0 and 
+                result.get("error") == 0 and 
+                result.get("data", {}).get("total", 0) > 0
+            )
+        # 如果没有response字段但也不是错误结构，可能是其他格式
+        elif "query_success" not in result:
+            result["query_success"] = True
+            result["has_data"] = False
+    
+    return make_entry(name, cert_no, result), True
+
+
+def result_athletes(data):
+    """从查询记录中提取 (是否查询成功, 是否有数据, 运动员列表)"""
+    response = data.get("response", {})
+    if not isinstance(response, dict):
+        return False, False, []
+    athletes = []
+    if response.get("has_data", False):
+        if "data" in response and isinstance(response["data"], dict):
+            athletes = response["data"].get("list", [])
+            if not isinstance(athletes, list):
+                athletes = []
+    return response.get("query_success", False), response.get("has_data", False), athletes
+
 
 class SimpleAthleteQuery:
     """运动员等级证书编号查询工具"""
@@ -125,13 +220,21 @@ class SimpleAthleteQuery:
         """生成缓存键"""
         return f"{name}_{cert_no}"
     
+    def get_cached(self, cache_key):
+        """获取可用的缓存结果，查询失败的缓存不算（会重新查询）"""
+        item = self.cache.get(cache_key)
+        if item is None or result_rank(item) == 0:
+            return None
+        return item
+    
     async def query_one(self, session, name, cert_no):
         """查询单个证书号"""
         cache_key = self.get_cache_key(name, cert_no)
         
         # 检查缓存
-        if cache_key in self.cache:
-            return cert_no, self.cache[cache_key], True  # True表示来自缓存
+        cached = self.get_cached(cache_key)
+        if cached is not None:
+            return cert_no, cached, True  # True表示来自缓存
         
         # 发送请求
         data = {
@@ -151,84 +254,19 @@ class SimpleAthleteQuery:
                         # 先尝试正常的JSON解析
                         result = await resp.json()
                     except Exception:
-                        try:
-                            # 如果失败，强制从文本解析JSON（忽略content-type）
-                            text_content = await resp.text()
-                            result = json.loads(text_content)
-                        except Exception as e:
-                            # 最终失败才报错
-                            text_content = await resp.text()
-                            result = {
-                                "query_success": False,
-                                "has_data": False,
-                                "error": f"JSON解析失败: {str(e)}",
-                                "content_type": resp.headers.get('content-type', '未知'),
-                                "response_text": text_content[:500]
-                            }
-                    
-                    # 检查是否只有error字段（无response字段），或error为null/空字符串且没有其他有效字段
-                    # 这种情况视为查询失败，不缓存
-                    if isinstance(result, dict):
-                        # 情况1: 只有error字段，且为空字符串或null
-                        if "response" not in result and "error" in result:
-                            error_value = result.get("error")
-                            if error_value is None or error_value == "":
-                                return cert_no, {
-                                    "time": datetime.now().isoformat(),
-                                    "cert_no": cert_no,
-                                    "name": name,
-                                    "response": {
-                                        "query_success": False,
-                                        "has_data": False,
-                                        "error": "API返回无效响应（error为空或null），视为查询失败"
-                                    }
-                                }, False  # 不缓存
-                        
-                        # 情况2: 有response字段，但error不为0，视为查询失败
-                        if "response" in result and "error" in result:
-                            error_value = result.get("error")
-                            # error不为0（可能是数字或字符串），视为失败
-                            if error_value != 0 and error_value != "0":
-                                return cert_no, {
-                                    "time": datetime.now().isoformat(),
-                                    "cert_no": cert_no,
-                                    "name": name,
-                                    "response": {
-                                        "query_success": False,
-                                        "has_data": False,
-                                        "error": f"API返回error={error_value}，查询失败"
-                                    }
-                                }, False  # 不缓存
-                    
-                    # 标记查询是否成功和是否有数据
-                    if isinstance(result, dict):
-                        # 如果结果包含response字段，说明是API正常响应
-                        if "response" in result:
-                            result["query_success"] = True
-                            result["has_data"] = (
-                                result.get("response") == 0 and 
-                                result.get("error") == 0 and 
-                                result.get("data", {}).get("total", 0) > 0
-                            )
-                        # 如果没有response字段但也不是错误结构，可能是其他格式
-                        elif "query_success" not in result:
-                            result["query_success"] = True
-                            result["has_data"] = False
+                        # 如果失败，强制从文本解析JSON（忽略content-type）
+                        text_content = await resp.text()
+                        result = parse_response_text(text_content, resp.headers.get('content-type', '未知'))
                 else:
-                    result = {
-                        "query_success": False,
-                        "has_data": False,
-                        "error": f"HTTP {resp.status}"
-                    }
+                    result = None
+                
+                entry, cacheable = classify_response(name, cert_no, resp.status, result)
+                if not cacheable:
+                    return cert_no, entry, False  # 不缓存
                 
                 # 缓存结果
-                self.cache[cache_key] = {
-                    "time": datetime.now().isoformat(),
-                    "cert_no": cert_no,
-                    "name": name,
-                    "response": result
-                }
-                return cert_no, self.cache[cache_key], False  # False表示新查询
+                self.cache[cache_key] = entry
+                return cert_no, entry, False  # False表示新查询
                 
         except Exception as e:
             # 缓存错误结果
@@ -252,7 +290,7 @@ class SimpleAthleteQuery:
         
         # 统计缓存情况
         cached_count = sum(1 for cert in cert_numbers 
-                          if self.get_cache_key(name, cert) in self.cache)
+                          if self.get_cached(self.get_cache_key(name, cert)) is not None)
         
         print(f"查询运动员: {name}")
         print(f"证书号范围: {start_num} - {end_num} (共{total}个)")
@@ -308,23 +346,19 @@ class SimpleAthleteQuery:
                             new_queries += 1
                         
                         # 统计查询结果
-                        response = data.get("response", {})
-                        if isinstance(response, dict):
-                            # 统计成功的查询（网络请求成功）
-                            if response.get("query_success", False):
-                                successful_queries += 1
-                            
-                            # 统计有效数据（有运动员信息）
-                            if response.get("has_data", False):
-                                valid_data_count += 1
-                                # 计算找到的运动员数量并保存到txt
-                                if "data" in response and isinstance(response["data"], dict):
-                                    athletes = response["data"].get("list", [])
-                                    if isinstance(athletes, list):
-                                        found_athletes += len(athletes)
-                                        # 保存每个找到的运动员信息
-                                        for athlete in athletes:
-                                            self.save_found_certificate(athlete)
+                        query_success, has_data, athletes = result_athletes(data)
+                        # 统计成功的查询（网络请求成功）
+                        if query_success:
+                            successful_queries += 1
+                        
+                        # 统计有效数据（有运动员信息）
+                        if has_data:
+                            valid_data_count += 1
+                            # 计算找到的运动员数量并保存到txt
+                            found_athletes += len(athletes)
+                            # 保存每个找到的运动员信息
+                            for athlete in athletes:
+                                self.save_found_certificate(athlete)
                         
                         pbar.update(1)
         
@@ -359,18 +393,13 @@ class SimpleAthleteQuery:
             print(f"\n查询到的等级证书编号:")
             count = 0
             for result in results:
-                response = result.get("response", {})
-                if isinstance(response, dict) and response.get("has_data", False):
-                    if "data" in response and isinstance(response["data"], dict):
-                        athletes = response["data"].get("list", [])
-                        if isinstance(athletes, list):
-                            for athlete in athletes:
-                                count += 1
-                                cert_no = athlete.get('certificateNo', '未知')
-                                name = athlete.get('athleteRealName', '未知')
-                                rank = athlete.get('rankTitle', '未知')
-                                item = athlete.get('item', '未知')
-                                print(f"  {count}. 证书编号: {cert_no} | {name} - {rank} - {item}")
+                for athlete in result_athletes(result)[2]:
+                    count += 1
+                    cert_no = athlete.get('certificateNo', '未知')
+                    name = athlete.get('athleteRealName', '未知')
+                    rank = athlete.get('rankTitle', '未知')
+                    item = athlete.get('item', '未知')
+                    print(f"  {count}. 证书编号: {cert_no} | {name} - {rank} - {item}")
         
         # 显示一些无效查询的示例（用于调试）
         failed_queries = [r for r in results if not r.get("response", {}).get("query_success", False)]
@@ -395,6 +424,21 @@ def main():
         print("姓名不能为空!")
         return
     
+    query_tool = SimpleAthleteQuery()
+    
+    # 显示该运动员的历史覆盖情况，方便选择查询范围
+    coverage = CertCoverage.from_records(name, query_tool.cache.values())
+    if len(coverage.probed) > 0:
+        print(f"历史已探测 {coverage.probed.total()} 个号码:")
+        for line in format_ranges(coverage.probed, limit=10):
+            print(line)
+        if coverage.hits:
+            hits = ', '.join(str(n) for n in coverage.hits[:10])
+            if len(coverage.hits) > 10:
+                hits += f" ... 共{len(coverage.hits)}个"
+            print(f"历史命中: {hits}")
+        print("完整覆盖情况和待查区间可用 python cert_coverage.py 查看")
+    
     try:
         start_str = input("请输入起始证书号 (如 20210000): ").strip()
         start_num = int(start_str)
@@ -416,8 +460,6 @@ def main():
         return
     
     # 执行查询
-    query_tool = SimpleAthleteQuery()
-    
     try:
         asyncio.run(query_tool.batch_query(name, start_num, end_num))
     except KeyboardInterrupt:
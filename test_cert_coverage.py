@@ -0,0 +1,110 @@
+"""
+测试证书号覆盖情况查询工具 (cert_coverage.py)
+"""
+import json
+
+import pytest
+
+import compact_history
+from cert_coverage import CertCoverage, IntervalIndex, load_coverage
+
+
+class TestIntervalIndex:
+    """区间索引测试"""
+
+    def test_merge_and_queries(self):
+        index = IntervalIndex.from_numbers([5, 3, 4, 10, 11, 4, 20])
+        assert list(index) == [(3, 5), (10, 11), (20, 20)]
+        assert index.total() == 6
+        assert 4 in index and 6 not in index and 20 in index and 2 not in index
+        assert index.count(4, 10) == 3
+        assert index.count(0, 100) == 6
+        assert list(index.overlapping(4, 10)) == [(4, 5), (10, 10)]
+        assert list(index.gaps(1, 21)) == [(1, 2), (6, 9), (12, 19), (21, 21)]
+        assert list(IntervalIndex().gaps(1, 3)) == [(1, 3)]
+
+    def test_large_index_queries(self):
+        """百万级条目上的查询只访问 O(log n) 个元素"""
+        numbers = [n for n in range(20000000, 22000000) if n % 7]
+        index = IntervalIndex.from_numbers(numbers)
+        assert index.total() == len(numbers)
+
+        # 统计查询时对区间列表的访问次数
+        accesses = [0]
+
+        class CountingList(list):
+            def __getitem__(self, i):
+                accesses[0] += 1
+                return list.__getitem__(self, i)
+
+        index.starts = CountingList(index.starts)
+        index.ends = CountingList(index.ends)
+        index._prefix = CountingList(index._prefix)
+        limit = 4 * (len(index).bit_length() + 2)
+
+        for lo in (20000000, 20700001, 21999990):
+            accesses[0] = 0
+            assert index.count(lo, lo + 5000) == sum(1 for n in range(lo, lo + 5001) if n % 7 and n < 22000000)
+            assert accesses[0] <= limit
+
+            accesses[0] = 0
+            assert ((lo + 3) in index) == bool((lo + 3) % 7)
+            assert accesses[0] <= limit
+
+            accesses[0] = 0
+            first_gap = next(index.gaps(lo, lo + 5000))
+            assert accesses[0] <= limit
+            assert first_gap[0] % 7 == 0
+
+
+class TestCertCoverage:
+    """覆盖情况测试"""
+
+    def test_from_records_and_plan(self, make_item):
+        records = [make_item("张三", n) for n in range(100, 110)]
+        records += [make_item("张三", n) for n in range(120, 125)]
+        records += [
+            make_item("张三", 105, has_data=True),
+            make_item("张三", 112, success=False),
+            make_item("张三", 103, success=False),  # 已有成功结果，不算错误空洞
+            make_item("张三", "A12"),
+            make_item("李四", 111),
+        ]
+        coverage = CertCoverage.from_records("张三", records)
+
+        assert list(coverage.probed) == [(100, 109), (120, 124)]
+        assert coverage.hits == [105]
+        assert list(coverage.errors) == [(112, 112)]
+        assert coverage.non_numeric == 1
+        assert coverage.default_range() == (100, 124)
+        assert coverage.gaps(95, 130) == [(95, 99), (110, 119), (125, 130)]
+
+        assert coverage.plan(95, 130) == [(95, 99), (110, 119), (125, 130)]
+        assert coverage.plan(95, 130, merge_gap=5) == [(95, 99), (110, 130)]
+        assert coverage.plan(110, 119, max_size=4) == [(110, 113), (114, 117), (118, 119)]
+
+        with pytest.raises(ValueError):
+            coverage.plan(95, 130, max_size=-1)
+        with pytest.raises(ValueError):
+            coverage.plan(95, 130, max_size=0)
+        with pytest.raises(ValueError):
+            coverage.plan(95, 130, merge_gap=-1)
+
+    def test_load_coverage_with_index_and_logs(self, tmp_path, make_item):
+        cache_file = str(tmp_path / "history.json")
+        logs_dir = tmp_path / "logs"
+        logs_dir.mkdir()
+
+        records = {}
+        for item in [make_item("张三", n) for n in range(1, 6)] + [make_item("李四", 3)]:
+            records[f"{item['name']}_{item['cert_no']}"] = item
+        compact_history.write_store(records, cache_file)
+
+        log_items = [make_item("张三", 6, has_data=True), make_item("张三", 7, success=False)]
+        with open(logs_dir / "results_张三_20240101000000_6_7_2.json", 'w', encoding='utf-8') as f:
+            json.dump(log_items, f, ensure_ascii=False)
+
+        coverage = load_coverage("张三", cache_file, str(logs_dir))
+        assert list(coverage.probed) == [(1, 6)]
+        assert coverage.hits == [6]
+        assert list(coverage.errors) == [(7, 7)]
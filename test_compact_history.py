@@ -0,0 +1,151 @@
+"""
+测试历史缓存压缩工具 (compact_history.py)
+"""
+import json
+import os
+
+import pytest
+
+import compact_history
+
+
+def write_lines(path, items, closed=True):
+    """按 sniper.py 的格式写出每行一条的数组"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for i, item in enumerate(items):
+            json_str = json.dumps(item, ensure_ascii=False)
+            f.write(f'  {json_str},\n' if i < len(items) - 1 or not closed else f'  {json_str}\n')
+        if closed:
+            f.write(']')
+
+
+class TestIterJSONRecords:
+    """流式读取测试"""
+
+    def test_array_small_chunks(self, tmp_path, make_item):
+        """块大小很小时仍能完整解析"""
+        items = [make_item("张三", str(20210000 + i), "2024-01-01T00:00:00") for i in range(20)]
+        path = tmp_path / "a.json"
+        write_lines(path, items)
+        parsed = [item for _, item in compact_history.iter_json_records(path, chunk_size=7)]
+        assert parsed == items
+
+    def test_pretty_printed_and_dict(self, tmp_path, make_item):
+        """缩进格式和字典格式"""
+        item = make_item("李四", "20220001", "2024-01-01T00:00:00")
+        path = tmp_path / "b.json"
+        path.write_text(json.dumps({"李四_20220001": item}, ensure_ascii=False, indent=4), encoding='utf-8')
+        parsed = list(compact_history.iter_json_records(path, chunk_size=5))
+        assert parsed == [("李四_20220001", item)]
+
+    def test_truncated(self, tmp_path, make_item):
+        """中断运行留下的临时文件：已写完的记录可读，最后报截断"""
+        items = [make_item("张三", str(i), "2024-01-01T00:00:00") for i in range(3)]
+        path = tmp_path / "results_张三_temp.json"
+        write_lines(path, items, closed=False)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('  {"time": "2024')
+        parsed = []
+        with pytest.raises(compact_history.TruncatedJSONError):
+            for _, item in compact_history.iter_json_records(path, chunk_size=16):
+                parsed.append(item)
+        assert parsed == items
+
+    def test_corrupt_middle(self, tmp_path, make_item):
+        """中间记录损坏时立即报错，不当作截断"""
+        items = [make_item("张三", str(i), "2024-01-01T00:00:00") for i in range(5)]
+        path = tmp_path / "c.json"
+        write_lines(path, items)
+        lines = path.read_text(encoding='utf-8').splitlines()
+        lines[2] = '  {"time": "2024", broken},'
+        path.write_text('\n'.join(lines), encoding='utf-8')
+        parsed = []
+        with pytest.raises(compact_history.CorruptJSONError):
+            for _, item in compact_history.iter_json_records(path, chunk_size=16):
+                parsed.append(item)
+        assert parsed == items[:1]
+
+
+class TestCompact:
+    """压缩流程测试"""
+
+    def test_compact(self, tmp_path, make_item):
+        cache_file = str(tmp_path / "history.json")
+        logs_dir = tmp_path / "logs"
+        logs_dir.mkdir()
+
+        write_lines(cache_file, [
+            make_item("张三", "20210002", "2024-01-01T00:00:00"),
+            make_item("张三", "20210001", "2024-01-01T00:00:00", has_data=True),
+            make_item("张三", "20210003", "2024-01-01T00:00:00", success=False),
+        ])
+        write_lines(logs_dir / "results_张三_20240102000000_20210001_20210004_4.json", [
+            # 更新的无数据结果不能覆盖有数据的结果
+            make_item("张三", "20210001", "2024-01-02T00:00:00"),
+            make_item("张三", "20210002", "2024-01-02T00:00:00"),
+            make_item("张三", "20210004", "2024-01-02T00:00:00", success=False),
+            make_item("李四", "A100", "2024-01-02T00:00:00"),
+        ])
+
+        stats = compact_history.compact(cache_file, str(logs_dir), prune_logs=True)
+        assert stats["records"] == 7
+        assert stats["errors"] == 2
+        assert stats["duplicates"] == 2
+        assert stats["output_records"] == 3
+        assert stats["pruned"] == 1
+        assert os.listdir(logs_dir) == []
+
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        assert [(x["name"], x["cert_no"]) for x in stored] == [
+            ("张三", "20210001"), ("张三", "20210002"), ("李四", "A100")
+        ]
+        by_key = {f"{x['name']}_{x['cert_no']}": x for x in stored}
+        assert by_key["张三_20210001"]["response"]["has_data"] is True
+        assert by_key["张三_20210002"]["time"] == "2024-01-02T00:00:00"
+
+        # 索引可以直接定位到单个姓名的记录
+        index = compact_history.load_index(cache_file)
+        assert index is not None
+        certs = [x["cert_no"] for x in compact_history.iter_store_name(cache_file, "张三", index)]
+        assert certs == ["20210001", "20210002"]
+
+        # 字符串中的 U+2028、U+2029、U+0085 不会把记录拆断
+        item = make_item("王五", "20230001", has_data=True)
+        item["response"]["data"]["list"] = [{"item": "跳远\u2028三级跳\u2029跨栏\u0085"}]
+        compact_history.write_store({"王五_20230001": item}, cache_file)
+        index = compact_history.load_index(cache_file)
+        assert list(compact_history.iter_store_name(cache_file, "王五", index)) == [item]
+
+        # 存储文件被改写后索引失效
+        with open(cache_file, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        assert compact_history.load_index(cache_file) is None
+
+    def test_prune_keeps_unsafe_logs(self, tmp_path, make_item):
+        """损坏、截断、运行中和无效的日志都不删除，也不中断压缩"""
+        cache_file = str(tmp_path / "history.json")
+        logs_dir = tmp_path / "logs"
+        logs_dir.mkdir()
+        items = [make_item("张三", str(i), "2024-01-01T00:00:00") for i in range(5)]
+
+        finished = logs_dir / "results_张三_20240101000000_0_4_5.json"
+        write_lines(finished, items)
+        corrupt = logs_dir / "results_张三_20240102000000_0_4_5.json"
+        write_lines(corrupt, items)
+        lines = corrupt.read_text(encoding='utf-8').splitlines()
+        lines[2] = '  {"time": "2024", broken},'
+        corrupt.write_text('\n'.join(lines), encoding='utf-8')
+        running = logs_dir / "results_张三_20240103000000_5_9_temp.json"
+        write_lines(running, [make_item("张三", "5", "2024-01-03T00:00:00")], closed=False)
+        stray = logs_dir / "results_x.json"
+        stray.write_text('"oops"', encoding='utf-8')
+
+        stats = compact_history.compact(cache_file, str(logs_dir), prune_logs=True)
+        assert stats["corrupt"] == 1
+        assert stats["truncated"] == 1
+        assert stats["invalid_files"] == 1
+        assert stats["output_records"] == 6
+        assert stats["pruned"] == 1
+        assert sorted(os.listdir(logs_dir)) == sorted([corrupt.name, running.name, stray.name])
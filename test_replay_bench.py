@@ -0,0 +1,47 @@
+"""
+测试响应判定回放 (replay_bench.py)
+"""
+import json
+import os
+
+import replay_bench
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), replay_bench.CORPUS_FILE)
+
+
+class TestReplay:
+    """回放语料测试"""
+
+    def test_corpus_matches(self):
+        """语料中的每条响应判定结果与录制时一致"""
+        cases = replay_bench.load_corpus(CORPUS_FILE)
+        assert cases
+        _, mismatches = replay_bench.check(cases)
+        assert mismatches == []
+
+    def test_capture_from_logs(self, tmp_path):
+        """由回放结果写出的日志可以还原出相同的语料"""
+        cases = replay_bench.load_corpus(CORPUS_FILE)
+        logs_dir = tmp_path / "logs"
+        logs_dir.mkdir()
+        entries = [replay_bench.replay_case(case)[0] for case in cases]
+        with open(logs_dir / "results_测试_20240101000000_0_0_1.json", 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+        corpus_file = str(tmp_path / "corpus.jsonl")
+        added = replay_bench.capture(str(logs_dir), corpus_file)
+        captured = replay_bench.load_corpus(corpus_file)
+        assert sum(added.values()) == len(captured)
+
+        # 请求异常等无法还原的结果被跳过，其余标签与原语料一致
+        by_cert = {case["cert_no"]: case for case in cases}
+        for case in captured:
+            assert case["expected"] == by_cert[case["cert_no"]]["expected"]
+        _, mismatches = replay_bench.check(captured)
+        assert mismatches == []
+
+    def test_benchmark(self):
+        cases = replay_bench.load_corpus(CORPUS_FILE)
+        results = replay_bench.benchmark(cases, repeat=2)
+        assert set(results) == {"parse", "parse+classify", "aggregate"}
+        assert all(cpu >= 0 and wall >= 0 for cpu, wall in results.values())
@@ -0,0 +1,22 @@
+"""
+测试运动员等级证书编号查询工具 (sniper.py)
+"""
+import sniper
+
+
+class TestSimpleAthleteQuery:
+    """查询工具测试"""
+
+    def test_get_cached_skips_failures(self, tmp_path, monkeypatch, make_item):
+        """查询失败的缓存不算已缓存，会被重新查询"""
+        monkeypatch.chdir(tmp_path)
+        query_tool = sniper.SimpleAthleteQuery()
+        query_tool.cache = {
+            "张三_1": make_item("张三", 1),
+            "张三_2": make_item("张三", 2, has_data=True),
+            "张三_3": make_item("张三", 3, success=False),
+        }
+        assert query_tool.get_cached("张三_1") is query_tool.cache["张三_1"]
+        assert query_tool.get_cached("张三_2") is query_tool.cache["张三_2"]
+        assert query_tool.get_cached("张三_3") is None
+        assert query_tool.get_cached("张三_4") is None